@@ -0,0 +1,142 @@
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+from CORE.config import SNAPSHOT_PATH
+
+LEASE_SECONDS = 60
+POLL_INTERVAL = 1
+
+
+class LeaseLost(Exception):
+    """Raised inside a build once another worker may have taken over its job."""
+
+
+def prepare_builder(builder, build_template=True):
+    """Imports the snapshot if the environment is missing, then makes sure the builder is ready.
+
+    With build_template=False the shared TemplateUltra.apk is never regenerated, so the
+    node must already be prepared or have a snapshot to import.
+    """
+    print("Initializing Ultra Fast APK Builder environment...")
+    if not builder.is_ready() and os.path.exists(SNAPSHOT_PATH):
+        try:
+            builder.import_snapshot(SNAPSHOT_PATH)
+        except Exception as e:
+            print(f"Failed to import snapshot {SNAPSHOT_PATH}: {e}")
+
+    if not build_template and not builder.is_ready():
+        raise RuntimeError(f"Build environment missing and no usable snapshot at {SNAPSHOT_PATH}. "
+                           f"Export one with `python3 CORE/ultra_fast_builder.py export {SNAPSHOT_PATH}`.")
+
+    builder.prepare_environment()
+    print("Ultra Fast APK Builder ready!")
+
+
+class BuildWorker:
+    """Leases jobs from the queue and runs them through UltraFastBuilder.
+
+    Only start a worker once prepare_builder() succeeded: a worker that can't
+    build would lease and fail jobs that healthy nodes could have run.
+    """
+
+    def __init__(self, queue, builder, worker_id=None):
+        self.queue = queue
+        self.builder = builder
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def run_forever(self, stop_event=None):
+        print(f"Worker {self.worker_id} waiting for jobs...")
+        while not (stop_event and stop_event.is_set()):
+            try:
+                if not self.run_once():
+                    time.sleep(POLL_INTERVAL)
+            except Exception as e:
+                # Queue errors (e.g. a locked database) shouldn't kill the worker
+                print(f"Worker error: {e}")
+                time.sleep(POLL_INTERVAL)
+
+    def run_once(self):
+        """Runs a single job if one is pending. Returns False when the queue was empty."""
+        job = self.queue.lease(self.worker_id, LEASE_SECONDS)
+        if not job:
+            return False
+        self._run_job(job)
+        return True
+
+    def _heartbeat(self, job_id, lease_lost, progress=None):
+        try:
+            if not self.queue.heartbeat(job_id, self.worker_id, LEASE_SECONDS, progress):
+                print(f"Lost lease on job {job_id}")
+                lease_lost.set()
+        except Exception as e:
+            # The lease may still be valid; the next heartbeat retries
+            print(f"Heartbeat error on job {job_id}: {e}")
+
+    def _run_job(self, job):
+        job_id = job['id']
+        apk_name = job['apk_name']
+
+        # Ensure apk_name ends with .apk
+        if not apk_name.endswith('.apk'):
+            apk_name += '.apk'
+
+        progress = {'value': 0}
+        done = threading.Event()
+        lease_lost = threading.Event()
+
+        def update_progress(p):
+            # Abort between steps once the job may be running elsewhere
+            if lease_lost.is_set():
+                raise LeaseLost(f"Lease on job {job_id} lost")
+            progress['value'] = p
+            self._heartbeat(job_id, lease_lost, p)
+
+        # Keep the lease alive even while a single build step runs longer than the lease
+        def heartbeat():
+            while not done.wait(LEASE_SECONDS / 3) and not lease_lost.is_set():
+                self._heartbeat(job_id, lease_lost, progress['value'])
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+
+        # Temp files and the APK are keyed per attempt, so a stale run whose lease expired
+        # never writes the same files as the re-leased run or another user's same-named app
+        build_id = f"{job_id}_{job['attempts']}"
+        output_dir = os.path.join(self.builder.output_dir, build_id)
+
+        try:
+            print(f"Starting build for {apk_name} ({job['url']}) on {self.worker_id}")
+            output_path = self.builder.build(job['url'], apk_name, build_id,
+                                             progress_callback=update_progress, output_dir=output_dir)
+
+            if not os.path.exists(output_path):
+                raise Exception("Output file not found")
+            if lease_lost.is_set():
+                raise LeaseLost(f"Lease on job {job_id} lost")
+            # Stored relative to FINISHED_HERE, which every node shares
+            filename = build_id + "/" + os.path.basename(output_path)
+            if not self._finish(job_id, filename=filename):
+                shutil.rmtree(output_dir, ignore_errors=True)
+
+        except LeaseLost:
+            print(f"Discarding build for job {job_id}: lease lost")
+            shutil.rmtree(output_dir, ignore_errors=True)
+        except Exception as e:
+            print(f"Build error: {e}")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            self._finish(job_id, error=str(e))
+        finally:
+            done.set()
+
+    def _finish(self, job_id, filename=None, error=None):
+        if error is None:
+            ok = self.queue.complete(job_id, self.worker_id, filename)
+        else:
+            ok = self.queue.fail(job_id, self.worker_id, error)
+        if not ok:
+            print(f"Could not record result for job {job_id}: lease no longer held by {self.worker_id}")
+        return ok
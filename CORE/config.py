@@ -0,0 +1,15 @@
+import os
+
+# Shared configuration for server.py and worker.py
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(os.path.dirname(CORE_DIR), 'FINISHED_HERE')
+
+# Prepared-environment snapshot imported at startup (see UltraFastBuilder.export_snapshot)
+SNAPSHOT_PATH = os.environ.get('BUILDER_SNAPSHOT', os.path.join(CORE_DIR, 'env_snapshot.tar.gz'))
+
+# Shared job queue; every server and worker must point at the same file
+QUEUE_DB = os.environ.get('JOB_QUEUE_DB', os.path.join(os.path.dirname(CORE_DIR), 'job_queue.sqlite3'))
+
+# Number of build workers to run inside server.py. Set to 0 to only enqueue
+# and serve results, with separate `python3 worker.py` nodes doing the builds.
+LOCAL_WORKERS = int(os.environ.get('LOCAL_WORKERS', '4'))
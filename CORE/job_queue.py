@@ -0,0 +1,168 @@
+import os
+import time
+import uuid
+import sqlite3
+
+class JobQueue:
+    """Build job queue shared by the front-end server and any number of workers.
+
+    Backed by a single SQLite file, so every process that can see the file
+    (same host or a shared volume) can enqueue or lease jobs. A leased job
+    stays 'running' only while its worker keeps heartbeating; once the lease
+    expires the job goes back to 'pending' for another worker. Jobs no worker
+    picks up within PENDING_TIMEOUT seconds fail instead of waiting forever.
+    """
+    MAX_ATTEMPTS = 3
+    PENDING_TIMEOUT = 15 * 60
+    LEASE_EXPIRED_ERROR = "Worker lease expired too many times"
+    PENDING_TIMEOUT_ERROR = "No build worker picked up the job in time"
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # WAL lets the server read status while a worker holds the write lock
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    apk_name TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    filename TEXT,
+                    error TEXT,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _connect(self):
+        # One connection per call keeps this safe to share between threads
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Transaction(conn)
+
+    def enqueue(self, apk_name, url):
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, apk_name, url, status, created, updated) VALUES (?, ?, ?, 'pending', ?, ?)",
+                (job_id, apk_name, url, now, now))
+        return job_id
+
+    def get(self, job_id):
+        """Returns the job dict or None. A plain read, so status polls never take the write lock."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+
+        # Report what the next lease() sweep will record, even if no worker is leasing.
+        # 'updated' is when a pending job was enqueued or last re-queued.
+        job = dict(row)
+        now = time.time()
+        if job['status'] == 'running' and job['lease_expires'] is not None and job['lease_expires'] < now:
+            if job['attempts'] >= self.MAX_ATTEMPTS:
+                job.update(status='failed', error=self.LEASE_EXPIRED_ERROR)
+            else:
+                job.update(status='pending', progress=0)
+        elif job['status'] == 'pending' and job['updated'] < now - self.PENDING_TIMEOUT:
+            job.update(status='failed', error=self.PENDING_TIMEOUT_ERROR)
+        return job
+
+    def lease(self, worker_id, lease_seconds):
+        """Claims the oldest pending job for worker_id. Returns the job dict or None."""
+        now = time.time()
+        with self._connect() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' ORDER BY created LIMIT 1").fetchone()
+            if not row:
+                return None
+
+            conn.execute("""
+                UPDATE jobs SET status = 'running', worker_id = ?, lease_expires = ?,
+                                attempts = attempts + 1, progress = 0, updated = ?
+                WHERE id = ?
+            """, (worker_id, now + lease_seconds, now, row['id']))
+            job = dict(row)
+
+        job.update(status='running', worker_id=worker_id, attempts=job['attempts'] + 1)
+        return job
+
+    def _expire_leases(self, conn, now):
+        # Jobs whose worker stopped heartbeating go back to the queue, unless they keep crashing workers
+        conn.execute("""
+            UPDATE jobs SET status = 'failed', error = ?,
+                            worker_id = NULL, lease_expires = NULL, updated = ?
+            WHERE status = 'running' AND lease_expires < ? AND attempts >= ?
+        """, (self.LEASE_EXPIRED_ERROR, now, now, self.MAX_ATTEMPTS))
+        conn.execute("""
+            UPDATE jobs SET status = 'pending', worker_id = NULL, lease_expires = NULL, progress = 0, updated = ?
+            WHERE status = 'running' AND lease_expires < ?
+        """, (now, now))
+        # Users were already told these failed, so don't build them late
+        conn.execute("""
+            UPDATE jobs SET status = 'failed', error = ?, updated = ?
+            WHERE status = 'pending' AND updated < ?
+        """, (self.PENDING_TIMEOUT_ERROR, now, now - self.PENDING_TIMEOUT))
+
+    def heartbeat(self, job_id, worker_id, lease_seconds, progress=None):
+        """Extends the lease and records progress. False means the lease was lost."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET lease_expires = ?, progress = COALESCE(?, progress), updated = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+            """, (now + lease_seconds, progress, now, job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, filename):
+        with self._connect() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET status = 'completed', progress = 100, filename = ?,
+                                lease_expires = NULL, updated = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+            """, (filename, time.time(), job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        with self._connect() as conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET status = 'failed', error = ?, lease_expires = NULL, updated = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+            """, (error, time.time(), job_id, worker_id))
+        return cursor.rowcount == 1
+
+
+class _Transaction:
+    """Runs the block inside BEGIN IMMEDIATE so lease() can't hand one job to two workers."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
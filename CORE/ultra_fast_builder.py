@@ -1,11 +1,19 @@
+import io
 import os
+import sys
+import json
+import time
 import shutil
+import hashlib
+import tarfile
 import subprocess
 import zipfile
 import tempfile
 
 class UltraFastBuilder:
     PLACEHOLDER_NAME = "PLACEHOLDER_APP_NAME__________________________" # 50 chars
+    SNAPSHOT_VERSION = 1
+    SNAPSHOT_MANIFEST = "snapshot.json"
 
     def __init__(self, core_dir):
         self.core_dir = core_dir
@@ -21,6 +29,8 @@ class UltraFastBuilder:
              
         self.sdk_dir = os.path.join(self.work_dir_base, "sdk")
         self.jdk_dir = os.path.join(self.work_dir_base, "jdk")
+        self.output_dir = os.path.join(os.path.dirname(self.core_dir), "FINISHED_HERE")
+        self.template_apk = os.path.join(self.output_dir, "TemplateUltra.apk")
 
     def _get_build_tool(self, tool_name):
         # Find build-tools in SDK
@@ -43,20 +53,273 @@ class UltraFastBuilder:
                     return tool_path
         return None
 
+    def is_ready(self):
+        """True when everything build() needs is already on disk."""
+        return (os.path.exists(self.template_apk)
+                and os.path.exists(self.keystore_path)
+                and self._get_build_tool("zipalign") is not None
+                and self._get_build_tool("apksigner") is not None)
+
     def prepare_environment(self):
         """Ensures template exists with the PLACEHOLDER name."""
         # Check if template APK exists
-        output_dir = os.path.join(os.path.dirname(self.core_dir), "FINISHED_HERE")
-        template_apk = os.path.join(output_dir, "TemplateUltra.apk")
-        
         zipalign = self._get_build_tool("zipalign")
 
-        if not os.path.exists(template_apk) or not zipalign:
+        if not os.path.exists(self.template_apk) or not zipalign:
             print("Generating Ultra Fast Template...")
             self._create_template()
             
         self._ensure_keystore()
 
+    # --- Environment snapshots ---
+    # A snapshot is a tar.gz holding only what build() touches: the JDK (for apksigner),
+    # the latest build-tools, debug.keystore and TemplateUltra.apk, plus a manifest with
+    # the format version and a sha256 per file. Importing one makes a fresh node ready
+    # without any download or Gradle run.
+
+    def _snapshot_sources(self):
+        """Returns [(archive_prefix, local_path)] for everything a snapshot contains."""
+        build_tools_dir = os.path.join(self.sdk_dir, "build-tools")
+        versions = sorted(os.listdir(build_tools_dir)) if os.path.exists(build_tools_dir) else []
+        if not versions or not self.is_ready():
+            raise FileNotFoundError("Build environment is not prepared, nothing to snapshot")
+
+        sources = [
+            ("env/sdk/build-tools/" + versions[-1], os.path.join(build_tools_dir, versions[-1])),
+            ("core/debug.keystore", self.keystore_path),
+            ("output/TemplateUltra.apk", self.template_apk),
+        ]
+        # The JDK is optional: without it apksigner falls back to the system java
+        if os.path.exists(self.jdk_dir):
+            sources.insert(0, ("env/jdk", self.jdk_dir))
+        return sources
+
+    def _snapshot_root(self, prefix):
+        """Local directory that archive entries under prefix/ install into."""
+        roots = {
+            "env": self.work_dir_base,
+            "core": self.core_dir,
+            "output": self.output_dir,
+        }
+        if prefix not in roots:
+            raise ValueError(f"Unexpected snapshot entry prefix: {prefix}")
+        return os.path.abspath(roots[prefix])
+
+    def _snapshot_target(self, arcname):
+        """Maps an archive member name back to its location on this node."""
+        prefix, _, rest = arcname.partition("/")
+        if not rest:
+            raise ValueError(f"Unexpected snapshot entry: {arcname}")
+
+        root = self._snapshot_root(prefix)
+        target = os.path.abspath(os.path.join(root, *rest.split("/")))
+        if os.path.commonpath([root, target]) != root:
+            raise ValueError(f"Snapshot entry escapes its root: {arcname}")
+        return target
+
+    @staticmethod
+    def _sha256(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def export_snapshot(self, archive_path):
+        """Writes a versioned, checksummed snapshot of the prepared environment."""
+        files = {}
+        links = {}
+        entries = []
+        for prefix, local in self._snapshot_sources():
+            if os.path.isfile(local):
+                entries.append((prefix, local))
+                continue
+            for root, dirs, names in os.walk(local):
+                rel_root = os.path.relpath(root, local)
+                for name in sorted(dirs) + sorted(names):
+                    path = os.path.join(root, name)
+                    arcname = prefix if rel_root == "." else prefix + "/" + rel_root.replace(os.sep, "/")
+                    arcname += "/" + name
+                    # Directories are implied by their files; links are kept as links
+                    if os.path.islink(path) or os.path.isfile(path):
+                        entries.append((arcname, path))
+
+        for arcname, path in entries:
+            if os.path.islink(path):
+                links[arcname] = os.readlink(path)
+            else:
+                files[arcname] = self._sha256(path)
+
+        manifest = {
+            "version": self.SNAPSHOT_VERSION,
+            "created": int(time.time()),
+            "platform": sys.platform,
+            "files": files,
+            "links": links,
+        }
+        manifest_bytes = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+
+        tmp_path = archive_path + ".part"
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            info = tarfile.TarInfo(self.SNAPSHOT_MANIFEST)
+            info.size = len(manifest_bytes)
+            info.mtime = manifest["created"]
+            tar.addfile(info, io.BytesIO(manifest_bytes))
+            for arcname, path in entries:
+                info = tar.gettarinfo(path, arcname=arcname)
+                if info.issym():
+                    tar.addfile(info)
+                    continue
+                # Hard links (common inside JDKs) would become LNKTYPE members; store plain copies
+                info.type = tarfile.REGTYPE
+                info.linkname = ""
+                info.size = os.path.getsize(path)
+                with open(path, 'rb') as f:
+                    tar.addfile(info, f)
+
+        # Make sure import_snapshot() will accept what we just wrote
+        try:
+            with tarfile.open(tmp_path, "r:gz") as tar:
+                self._read_snapshot_manifest(tar)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, archive_path)
+
+        print(f"Exported environment snapshot ({len(files)} files) to {archive_path}")
+        return archive_path
+
+    def _read_snapshot_manifest(self, tar):
+        """Loads the manifest and checks every archive member against it, without extracting."""
+        manifest = json.load(tar.extractfile(tar.getmember(self.SNAPSHOT_MANIFEST)))
+
+        if manifest.get("version") != self.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+        if manifest.get("platform") != sys.platform:
+            raise ValueError(f"Snapshot was made on {manifest.get('platform')}, not {sys.platform}")
+
+        files = manifest["files"]
+        links = manifest["links"]
+        members = [m for m in tar.getmembers() if m.name != self.SNAPSHOT_MANIFEST]
+        seen = set()
+        for member in members:
+            if member.name in seen:
+                raise ValueError(f"Duplicate snapshot entry: {member.name}")
+            seen.add(member.name)
+
+        for member in members:
+            name = member.name
+            # An entry can't live inside something that is itself a file or link
+            parts = name.split("/")
+            for i in range(1, len(parts)):
+                if "/".join(parts[:i]) in seen:
+                    raise ValueError(f"Snapshot entry conflicts with another entry: {name}")
+
+            self._snapshot_target(name)  # Rejects unknown or escaping paths
+
+            if member.issym() and links.get(name) == member.linkname:
+                link = member.linkname
+                resolved = os.path.normpath(os.path.join(os.path.dirname(name), link)).replace(os.sep, "/")
+                # The link must stay under the same root its own entry installs into
+                if os.path.isabs(link) or resolved.partition("/")[0] != name.partition("/")[0]:
+                    raise ValueError(f"Snapshot link escapes its root: {name}")
+                try:
+                    self._snapshot_target(resolved)
+                except ValueError:
+                    raise ValueError(f"Snapshot link escapes its root: {name}")
+            elif not (member.isfile() and name in files):
+                raise ValueError(f"Snapshot entry not in manifest: {name}")
+
+        missing = (set(files) | set(links)) - seen
+        if missing:
+            raise ValueError(f"Snapshot is missing {len(missing)} entries, e.g. {sorted(missing)[0]}")
+        return manifest
+
+    def import_snapshot(self, archive_path):
+        """Restores a snapshot made by export_snapshot(), verifying every checksum first."""
+        with tarfile.open(archive_path, "r:gz") as tar:
+            manifest = self._read_snapshot_manifest(tar)
+            files = manifest["files"]
+            links = manifest["links"]
+
+            # Stage everything next to the work dir and only move into place once verified
+            os.makedirs(self.work_dir_base, exist_ok=True)
+            staging = tempfile.mkdtemp(prefix="snapshot_", dir=self.work_dir_base)
+            try:
+                staged = {}
+                for member in tar.getmembers():
+                    name = member.name
+                    if name == self.SNAPSHOT_MANIFEST:
+                        continue
+                    staged_path = os.path.join(staging, *name.split("/"))
+                    os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+
+                    if member.issym():
+                        os.symlink(member.linkname, staged_path)
+                    else:
+                        with tar.extractfile(member) as src, open(staged_path, 'wb') as dst:
+                            shutil.copyfileobj(src, dst)
+                        os.chmod(staged_path, member.mode & 0o755)
+                        if self._sha256(staged_path) != files[name]:
+                            raise ValueError(f"Checksum mismatch in snapshot: {name}")
+                    staged[name] = staged_path
+
+                installed = 0
+                for name, staged_path in staged.items():
+                    target = self._snapshot_target(name)
+                    if self._snapshot_matches(target, files.get(name), links.get(name)):
+                        continue
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    if os.path.isdir(target) and not os.path.islink(target):
+                        shutil.rmtree(target)
+
+                    # Staging lives inside work_dir_base, so env/ entries move in one rename
+                    if name.startswith("env/"):
+                        os.replace(staged_path, target)
+                        installed += 1
+                        continue
+
+                    # CORE/ and FINISHED_HERE/ may be another filesystem (a shared volume) where
+                    # os.replace() from staging wouldn't work: copy next to the target, then
+                    # swap it in so other nodes never see the file missing.
+                    tmp_target = target + ".snapshot_tmp"
+                    if os.path.lexists(tmp_target):
+                        os.remove(tmp_target)
+                    if name in links:
+                        os.symlink(links[name], tmp_target)
+                    else:
+                        shutil.copy2(staged_path, tmp_target)
+                    os.replace(tmp_target, target)
+                    installed += 1
+
+                # Drop stale tools from an older install that the snapshot doesn't contain
+                for prefix in ("env/jdk", "env/sdk/build-tools"):
+                    self._prune_snapshot_dir(prefix, staged)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+
+        print(f"Imported environment snapshot ({installed} of {len(staged)} entries changed) from {archive_path}")
+
+    def _snapshot_matches(self, target, sha256, link):
+        """True when target already holds exactly the snapshot's file or link."""
+        if link is not None:
+            return os.path.islink(target) and os.readlink(target) == link
+        return (os.path.isfile(target) and not os.path.islink(target)
+                and self._sha256(target) == sha256)
+
+    def _prune_snapshot_dir(self, prefix, staged):
+        if not any(name.startswith(prefix + "/") for name in staged):
+            return
+        local = self._snapshot_target(prefix)
+        for root, dirs, names in os.walk(local, topdown=False):
+            rel_root = os.path.relpath(root, local)
+            for name in names + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+                arcname = prefix if rel_root == "." else prefix + "/" + rel_root.replace(os.sep, "/")
+                if arcname + "/" + name not in staged:
+                    os.remove(os.path.join(root, name))
+            if root != local and not os.listdir(root):
+                os.rmdir(root)
+
     def _ensure_keystore(self):
         if os.path.exists(self.keystore_path):
             return
@@ -139,8 +402,7 @@ class UltraFastBuilder:
             src = os.path.join(output_dir, placeholder_filename)
             dst = os.path.join(output_dir, "TemplateUltra.apk")
             if os.path.exists(src):
-                if os.path.exists(dst): os.remove(dst)
-                os.rename(src, dst)
+                os.replace(src, dst)  # Atomic, other workers may be reading the template
                 
         else:
             script_path = os.path.join(self.core_dir, "linux_mac_build_apk.sh")
@@ -159,18 +421,18 @@ class UltraFastBuilder:
             src = os.path.join(output_dir, self.PLACEHOLDER_NAME + ".apk")
             dst = os.path.join(output_dir, "TemplateUltra.apk")
             if os.path.exists(src):
-                if os.path.exists(dst): os.remove(dst)
-                os.rename(src, dst)
+                os.replace(src, dst)  # Atomic, other workers may be reading the template
 
-    def build(self, url, app_name, job_id, progress_callback=None):
+    def build(self, url, app_name, job_id, progress_callback=None, output_dir=None):
         if progress_callback: progress_callback(10)
         
-        output_dir = os.path.join(os.path.dirname(self.core_dir), "FINISHED_HERE")
-        template_apk = os.path.join(output_dir, "TemplateUltra.apk")
+        # Callers building in parallel pass their own output_dir so equal app names don't collide
+        output_dir = output_dir or self.output_dir
+        os.makedirs(output_dir, exist_ok=True)
         
         # 1. Copy Template
         temp_apk = os.path.join(self.work_dir_base, f"temp_{job_id}.apk")
-        shutil.copy2(template_apk, temp_apk)
+        shutil.copy2(self.template_apk, temp_apk)
         
         if progress_callback: progress_callback(30)
         
@@ -268,3 +530,17 @@ class UltraFastBuilder:
         if os.path.exists(aligned_apk): os.remove(aligned_apk)
         
         return final_apk_path
+
+
+if __name__ == "__main__":
+    # python3 CORE/ultra_fast_builder.py export|import <snapshot.tar.gz>
+    if len(sys.argv) != 3 or sys.argv[1] not in ("export", "import"):
+        print("Usage: ultra_fast_builder.py export|import <snapshot.tar.gz>")
+        sys.exit(1)
+
+    builder = UltraFastBuilder(os.path.dirname(os.path.abspath(__file__)))
+    if sys.argv[1] == "export":
+        builder.prepare_environment()
+        builder.export_snapshot(sys.argv[2])
+    else:
+        builder.import_snapshot(sys.argv[2])
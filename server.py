@@ -1,68 +1,36 @@
 import os
-import subprocess
+import shutil
 import threading
 import time
-import uuid
-import random
 from flask import Flask, render_template, request, jsonify, send_file, after_this_request
 
-app = Flask(__name__)
-
-# Configuration
-CORE_DIR = os.path.join(os.getcwd(), 'CORE')
-OUTPUT_DIR = os.path.join(os.getcwd(), 'FINISHED_HERE')
-
-BUILD_SCRIPT = os.path.join(CORE_DIR, 'linux_mac_build_apk.sh')
-
-# Global state to track jobs
-jobs = {}
-
-
-
+# Configuration (shared with worker.py, see CORE/config.py)
+from CORE.config import CORE_DIR, OUTPUT_DIR, QUEUE_DB, LOCAL_WORKERS
+from CORE.build_worker import BuildWorker, prepare_builder
+from CORE.job_queue import JobQueue
 from CORE.ultra_fast_builder import UltraFastBuilder
 
-# Initialize Fast Builder
-fast_builder = UltraFastBuilder(CORE_DIR)
+app = Flask(__name__)
+
+# Shared job queue
+job_queue = JobQueue(QUEUE_DB)
 
-# Start preparation in background
-def prepare_builder():
+# Start preparation and local workers in background
+def start_local_workers():
+    fast_builder = UltraFastBuilder(CORE_DIR)
     try:
-        print("Initializing Ultra Fast APK Builder environment...")
-        fast_builder.prepare_environment()
-        print("Ultra Fast APK Builder ready!")
+        prepare_builder(fast_builder)
     except Exception as e:
-        print(f"Failed to initialize builder: {e}")
-
-threading.Thread(target=prepare_builder).start()
+        # Leave queued jobs to other worker nodes rather than failing them here
+        print(f"Failed to initialize builder, not starting local workers: {e}")
+        return
 
-def run_build(job_id, apk_name, url):
-    jobs[job_id]['status'] = 'running'
-    jobs[job_id]['progress'] = 0
-    
-    # Ensure apk_name ends with .apk
-    if not apk_name.endswith('.apk'):
-        apk_name += '.apk'
-        
-    jobs[job_id]['filename'] = apk_name
+    for _ in range(LOCAL_WORKERS):
+        worker = BuildWorker(job_queue, fast_builder)
+        threading.Thread(target=worker.run_forever, daemon=True).start()
 
-    def update_progress(p):
-        jobs[job_id]['progress'] = p
-
-    try:
-        # Use the fast builder
-        print(f"Starting build for {apk_name} ({url})")
-        output_path = fast_builder.build(url, apk_name, job_id, progress_callback=update_progress)
-        
-        if os.path.exists(output_path):
-            jobs[job_id]['status'] = 'completed'
-            jobs[job_id]['progress'] = 100
-        else:
-            raise Exception("Output file not found")
-            
-    except Exception as e:
-        print(f"Build error: {e}")
-        jobs[job_id]['status'] = 'failed'
-        jobs[job_id]['error'] = str(e)
+if LOCAL_WORKERS > 0:
+    threading.Thread(target=start_local_workers).start()
 
 def delete_file_later(filepath, delay=3):
     def delayed_delete():
@@ -77,6 +45,11 @@ def delete_file_later(filepath, delay=3):
             if os.path.exists(idsig_path):
                 os.remove(idsig_path)
                 print(f"Deleted {idsig_path}")
+
+            # Builds go to a per-job directory under OUTPUT_DIR
+            job_dir = os.path.dirname(filepath)
+            if os.path.dirname(job_dir) == OUTPUT_DIR:
+                shutil.rmtree(job_dir, ignore_errors=True)
         except Exception as e:
             print(f"Error deleting {filepath}: {e}")
             
@@ -95,50 +68,40 @@ def create():
     if not apk_name or not url:
         return jsonify({'error': 'Missing parameters'}), 400
         
-    job_id = str(uuid.uuid4())
-    jobs[job_id] = {
-        'status': 'pending',
-        'apk_name': apk_name,
-        'url': url,
-        'start_time': time.time()
-    }
-    
-    thread = threading.Thread(target=run_build, args=(job_id, apk_name, url))
-    thread.start()
+    job_id = job_queue.enqueue(apk_name, url)
     
     return jsonify({'job_id': job_id})
 
 @app.route('/status/<job_id>')
 def status(job_id):
-    job = jobs.get(job_id)
+    job = job_queue.get(job_id)
     if not job:
         return jsonify({'error': 'Job not found'}), 404
         
     response = {
         'status': job['status'],
-        'progress': job.get('progress', 0)
+        'progress': job['progress']
     }
     
     if job['status'] == 'completed':
-        response['download_url'] = f"/download/{job['filename']}"
+        response['download_url'] = f"/download/{job_id}"
         
     return jsonify(response)
 
-@app.route('/download/<filename>')
-def download(filename):
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    
-    if not os.path.exists(filepath):
-        # Fallback to project root if not in OUTPUT_DIR (just in case script behavior changes)
-        filepath = os.path.join(os.getcwd(), filename)
-        
+@app.route('/download/<job_id>')
+def download(job_id):
+    job = job_queue.get(job_id)
+    if not job or job['status'] != 'completed':
+        return "File not found", 404
+
+    filepath = os.path.join(OUTPUT_DIR, *job['filename'].split('/'))
     if not os.path.exists(filepath):
         return "File not found", 404
 
     # Schedule deletion
     delete_file_later(filepath)
     
-    return send_file(filepath, as_attachment=True)
+    return send_file(filepath, as_attachment=True, download_name=os.path.basename(filepath))
 
 if __name__ == '__main__':
     # Ensure output directory exists
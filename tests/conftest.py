@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Entry points run from the repo root and import CORE as a namespace package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
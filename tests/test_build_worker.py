@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from CORE.build_worker import BuildWorker
+from CORE.job_queue import JobQueue
+
+
+class FakeBuilder:
+    """Writes a dummy APK where UltraFastBuilder.build() would, running on_progress mid-build."""
+
+    def __init__(self, output_dir, on_progress=None):
+        self.output_dir = output_dir
+        self.on_progress = on_progress
+        self.build_ids = []
+
+    def build(self, url, app_name, job_id, progress_callback=None, output_dir=None):
+        self.build_ids.append(job_id)
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, app_name)
+        with open(path, "w") as f:
+            f.write(url)
+        if self.on_progress:
+            self.on_progress()
+        progress_callback(100)
+        return path
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_output_goes_to_per_attempt_directory(queue, tmp_path):
+    output_dir = str(tmp_path / "FINISHED_HERE")
+    first = queue.enqueue("App", "https://a")
+    second = queue.enqueue("App", "https://b")
+    worker = BuildWorker(queue, FakeBuilder(output_dir), "w1")
+
+    assert worker.run_once() and worker.run_once()
+
+    paths = [queue.get(job_id)['filename'] for job_id in (first, second)]
+    assert paths == [f"{first}_1/App.apk", f"{second}_1/App.apk"]
+    with open(os.path.join(output_dir, *paths[0].split("/"))) as f:
+        assert f.read() == "https://a"
+
+
+def test_lost_lease_discards_output(queue, tmp_path):
+    output_dir = str(tmp_path / "FINISHED_HERE")
+    job_id = queue.enqueue("App", "https://a")
+
+    def steal_lease():
+        # Another worker re-leases the job while this build is still running
+        with queue._connect() as conn:
+            conn.execute("UPDATE jobs SET worker_id = 'other' WHERE id = ?", (job_id,))
+
+    worker = BuildWorker(queue, FakeBuilder(output_dir, on_progress=steal_lease), "w1")
+    worker.run_once()
+
+    job = queue.get(job_id)
+    assert job['status'] == 'running'
+    assert job['worker_id'] == 'other'
+    assert not os.path.exists(os.path.join(output_dir, f"{job_id}_1"))
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from CORE.job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_lease_hands_out_oldest_pending_job(queue):
+    first = queue.enqueue("First", "https://a")
+    queue.enqueue("Second", "https://b")
+
+    job = queue.lease("w1", 60)
+
+    assert job['id'] == first
+    assert job['attempts'] == 1
+    assert queue.get(first)['status'] == 'running'
+
+
+def test_expired_lease_is_requeued_until_max_attempts(queue):
+    job_id = queue.enqueue("App", "https://a")
+
+    for attempt in range(1, JobQueue.MAX_ATTEMPTS + 1):
+        # A negative lease simulates a worker that crashed right after leasing
+        job = queue.lease(f"w{attempt}", -1)
+        assert job['id'] == job_id
+        assert job['attempts'] == attempt
+
+    assert queue.lease("last", 60) is None
+    job = queue.get(job_id)
+    assert job['status'] == 'failed'
+    assert job['error'] == JobQueue.LEASE_EXPIRED_ERROR
+
+
+def test_complete_is_rejected_after_lease_lost(queue):
+    job_id = queue.enqueue("App", "https://a")
+    queue.lease("stale", -1)
+    queue.lease("fresh", 60)
+
+    assert not queue.heartbeat(job_id, "stale", 60, 50)
+    assert not queue.complete(job_id, "stale", "x/App.apk")
+    assert not queue.fail(job_id, "stale", "boom")
+    assert queue.complete(job_id, "fresh", "x/App.apk")
+    assert queue.get(job_id)['status'] == 'completed'
+
+
+def test_get_reports_expired_lease_without_writing(queue):
+    job_id = queue.enqueue("App", "https://a")
+    queue.lease("crashed", -1)
+
+    assert queue.get(job_id)['status'] == 'pending'
+    # Nothing was written: the worker that still holds the row can finish it
+    assert queue.complete(job_id, "crashed", "x/App.apk")
+
+
+def test_pending_job_times_out(queue):
+    queue.PENDING_TIMEOUT = -1
+    job_id = queue.enqueue("App", "https://a")
+
+    assert queue.get(job_id)['status'] == 'failed'
+    assert queue.lease("w1", 60) is None
+    assert queue.get(job_id)['error'] == JobQueue.PENDING_TIMEOUT_ERROR
+
+
+def test_concurrent_leases_never_share_a_job(queue):
+    for i in range(4):
+        queue.enqueue(f"App{i}", "https://a")
+    leased = []
+
+    def lease(worker_id):
+        job = queue.lease(worker_id, 60)
+        if job:
+            leased.append(job['id'])
+
+    threads = [threading.Thread(target=lease, args=(f"w{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(leased) == 4
+    assert len(set(leased)) == 4
@@ -0,0 +1,154 @@
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+from CORE.ultra_fast_builder import UltraFastBuilder
+
+
+def make_builder(base):
+    """UltraFastBuilder with every path it touches redirected under base."""
+    core_dir = os.path.join(base, "CORE")
+    os.makedirs(core_dir)
+    builder = UltraFastBuilder(core_dir)
+    builder.work_dir_base = os.path.join(base, "env")
+    builder.sdk_dir = os.path.join(builder.work_dir_base, "sdk")
+    builder.jdk_dir = os.path.join(builder.work_dir_base, "jdk")
+    builder.output_dir = os.path.join(base, "FINISHED_HERE")
+    builder.template_apk = os.path.join(builder.output_dir, "TemplateUltra.apk")
+    return builder
+
+
+@pytest.fixture
+def prepared(tmp_path):
+    builder = make_builder(str(tmp_path / "a"))
+    tools = os.path.join(builder.sdk_dir, "build-tools", "34.0.0")
+    os.makedirs(os.path.join(tools, "lib64"))
+    for tool in ("zipalign", "apksigner"):
+        with open(os.path.join(tools, tool), "w") as f:
+            f.write("#!/bin/sh\n")
+        os.chmod(os.path.join(tools, tool), 0o755)
+
+    java = os.path.join(builder.jdk_dir, "bin", "java")
+    os.makedirs(os.path.dirname(java))
+    with open(java, "w") as f:
+        f.write("java")
+    os.link(java, java + "-hardlink")
+    os.symlink("java", java + "-symlink")
+
+    os.makedirs(builder.output_dir)
+    with open(builder.keystore_path, "w") as f:
+        f.write("keystore")
+    with open(builder.template_apk, "w") as f:
+        f.write("template")
+    return builder
+
+
+def rewrite_archive(src, dst, manifest=None, content=None, extra_files=(), extra_links=()):
+    """Copies a snapshot, optionally replacing the manifest or file bytes, or adding entries."""
+    with tarfile.open(src, "r:gz") as tin, tarfile.open(dst, "w:gz") as tout:
+        for member in tin.getmembers():
+            data = tin.extractfile(member).read() if member.isfile() else None
+            if member.name == UltraFastBuilder.SNAPSHOT_MANIFEST and manifest is not None:
+                data = json.dumps(manifest(json.loads(data))).encode("utf-8")
+            elif content and member.name in content:
+                data = content[member.name]
+            if data is not None:
+                member.size = len(data)
+                tout.addfile(member, io.BytesIO(data))
+            else:
+                tout.addfile(member)
+        for name, data in extra_files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tout.addfile(info, io.BytesIO(data))
+        for name, target in extra_links:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tout.addfile(info)
+
+
+def test_round_trip_keeps_modes_and_links(prepared, tmp_path):
+    archive = str(tmp_path / "snapshot.tar.gz")
+    prepared.export_snapshot(archive)
+
+    fresh = make_builder(str(tmp_path / "b"))
+    assert not fresh.is_ready()
+    fresh.import_snapshot(archive)
+
+    assert fresh.is_ready()
+    assert os.access(fresh._get_build_tool("zipalign"), os.X_OK)
+    bin_dir = os.path.join(fresh.jdk_dir, "bin")
+    with open(os.path.join(bin_dir, "java-hardlink")) as f:
+        assert f.read() == "java"
+    assert os.readlink(os.path.join(bin_dir, "java-symlink")) == "java"
+
+
+def test_reimport_leaves_matching_files_alone(prepared, tmp_path):
+    archive = str(tmp_path / "snapshot.tar.gz")
+    prepared.export_snapshot(archive)
+    inode = os.stat(prepared.template_apk).st_ino
+
+    prepared.import_snapshot(archive)
+
+    assert os.stat(prepared.template_apk).st_ino == inode
+
+
+def test_tampered_file_is_rejected_before_install(prepared, tmp_path):
+    archive = str(tmp_path / "snapshot.tar.gz")
+    tampered = str(tmp_path / "tampered.tar.gz")
+    prepared.export_snapshot(archive)
+    rewrite_archive(archive, tampered, content={"output/TemplateUltra.apk": b"evil"})
+
+    fresh = make_builder(str(tmp_path / "b"))
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        fresh.import_snapshot(tampered)
+    assert not os.path.exists(fresh.template_apk)
+    assert not os.path.exists(fresh.keystore_path)
+
+
+def test_other_version_is_rejected(prepared, tmp_path):
+    archive = str(tmp_path / "snapshot.tar.gz")
+    other = str(tmp_path / "other.tar.gz")
+    prepared.export_snapshot(archive)
+    rewrite_archive(archive, other, manifest=lambda m: dict(m, version=m["version"] + 1))
+
+    with pytest.raises(ValueError, match="Unsupported snapshot version"):
+        make_builder(str(tmp_path / "b")).import_snapshot(other)
+
+
+@pytest.mark.parametrize("name, target", [
+    ("env/escape", "../core/debug.keystore"),
+    ("env/escape", ".."),
+    ("env/escape", "/etc/passwd"),
+    ("core/escape", "../../outside"),
+])
+def test_escaping_link_is_rejected(prepared, tmp_path, name, target):
+    archive = str(tmp_path / "snapshot.tar.gz")
+    bad = str(tmp_path / "bad.tar.gz")
+    prepared.export_snapshot(archive)
+
+    def add_link(manifest):
+        manifest["links"][name] = target
+        return manifest
+    rewrite_archive(archive, bad, manifest=add_link, extra_links=[(name, target)])
+
+    with pytest.raises(ValueError, match="escapes its root"):
+        make_builder(str(tmp_path / "b")).import_snapshot(bad)
+
+
+def test_entry_outside_known_roots_is_rejected(prepared, tmp_path):
+    archive = str(tmp_path / "snapshot.tar.gz")
+    bad = str(tmp_path / "bad.tar.gz")
+    prepared.export_snapshot(archive)
+
+    def add_file(manifest):
+        manifest["files"]["env/../../evil"] = "0" * 64
+        return manifest
+    rewrite_archive(archive, bad, manifest=add_file, extra_files=[("env/../../evil", b"evil")])
+
+    with pytest.raises(ValueError, match="escapes its root"):
+        make_builder(str(tmp_path / "b")).import_snapshot(bad)
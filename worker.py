@@ -0,0 +1,16 @@
+import os
+
+from CORE.build_worker import BuildWorker, prepare_builder
+from CORE.config import CORE_DIR, OUTPUT_DIR, QUEUE_DB
+from CORE.job_queue import JobQueue
+from CORE.ultra_fast_builder import UltraFastBuilder
+
+if __name__ == '__main__':
+    # Ensure output directory exists
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    builder = UltraFastBuilder(CORE_DIR)
+    # Worker nodes share FINISHED_HERE, so they never rebuild the template other nodes are reading
+    prepare_builder(builder, build_template=False)
+    BuildWorker(JobQueue(QUEUE_DB), builder).run_forever()